@@ -1,13 +1,26 @@
 import streamlit as st
 import os
-import subprocess
+import time
+import asyncio
 import json
+import orjson
 import shutil
+import sqlite3
+import hashlib
+from contextlib import closing
 from pathlib import Path
 import logging
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from itertools import islice
+import numpy as np
+import pyarrow as pa
 import ollama
+from pydantic import ValidationError
 import lancedb
 from ddgs import DDGS
+from search_arxiv import search_arxiv, ARXIV_REQUEST_INTERVAL
+from extract_paper_sections import process_multiple_papers
 
 # --- BASIC SETUP ---
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -17,81 +30,245 @@ DATA_DIR = Path("arxiv_data")
 PAPERS_DIR = DATA_DIR / "papers"
 DB_URI = DATA_DIR / "lancedb"
 SEARCH_RESULT_FILE = "arastirma_sonuclari.json"
+EMBED_CACHE_PATH = DATA_DIR / "embed_cache.sqlite"
+HTML_CACHE_DIR = DATA_DIR / "html_cache"
 
 LLM_MODEL_NAME = "phi3:3.8b"
 EMBEDDING_MODEL_NAME = "embeddinggemma:latest"
+EMBED_BATCH_SIZE = 128 if shutil.which("nvidia-smi") else 32  # larger batches only pay off on CUDA
+EMBED_WORKERS = max(1, int(os.environ.get("OLLAMA_NUM_PARALLEL", "1")))  # serial unless the server is known to run requests in parallel
+SEMANTIC_CACHE_THRESHOLD = 0.85; CACHE_MAX_ENTRIES = 1024
+ANN_INDEX_MIN_ROWS = 10_000; ANN_NPROBES = 8; ANN_EF = 30  # below ANN_INDEX_MIN_ROWS a flat scan is faster than an index
 
 # --- HELPER FUNCTIONS & TOOLS ---
 def setup_directories(): os.makedirs(PAPERS_DIR, exist_ok=True)
 setup_directories()
-def run_search_script(query: str) -> str:
+def _session_cache(name: str) -> OrderedDict:
+    # Module globals are reset on every Streamlit rerun, so caches live in the session state
+    if name not in st.session_state: st.session_state[name] = OrderedDict()
+    return st.session_state[name]
+def _cache_put(cache: OrderedDict, key, value):
+    cache[key] = value; cache.move_to_end(key)
+    if len(cache) > CACHE_MAX_ENTRIES: cache.popitem(last=False)
+def run_search_script(query: str) -> list:
+    """Searches Arxiv for one query in-process and returns the papers it found."""
     try:
-        if not os.path.exists("search_arxiv.py"): return "Error: 'search_arxiv.py' not found."
         st.toast(f"🔍 Searching Arxiv for: '{query}'")
-        subprocess.run(["python", "search_arxiv.py", "--query", query, "--limit", "5"], check=True, timeout=300)
-        return f"Search for '{query}' completed."
+        return search_arxiv(query, 5)
     except Exception as e:
         logger.error(f"Error in search script for query '{query}': {e}")
         st.error(f"An error occurred while searching for '{query}'. Please check the console logs.")
-        return f"Error during search for '{query}'."
+        return []
+def search_all(queries: list) -> list:
+    # The arXiv API allows one request every 3 seconds, so queries are spaced out rather than run concurrently
+    results = []
+    for i, query in enumerate(queries):
+        if i: time.sleep(ARXIV_REQUEST_INTERVAL)
+        results.append(run_search_script(query))
+    return results
 def run_extract_script() -> str:
     try:
-        if not os.path.exists("extract_paper_sections.py"): return "Error: 'extract_paper_sections.py' not found."
         if not os.path.exists(SEARCH_RESULT_FILE): return "Warning: Search result file not found, skipping extraction."
-        st.toast("📄 Processing papers...")
-        cmd = ["python", "extract_paper_sections.py", "--json-file", SEARCH_RESULT_FILE, "--output-dir", str(PAPERS_DIR)]
-        subprocess.run(cmd, check=True, timeout=600)
+        st.toast("📄 Processing papers..."); progress_bar = st.progress(0, text="Extracting paper sections...")
+        # Progress is reported from this (the script) thread as each paper's download finishes
+        process_multiple_papers(SEARCH_RESULT_FILE, output_dir=str(PAPERS_DIR), cache_dir=str(HTML_CACHE_DIR), on_progress=lambda done, total: progress_bar.progress(done / total, text=f"Extracted paper {done}/{total}"))
+        progress_bar.empty()
         count = len(list(PAPERS_DIR.glob("*.json")))
         return f"Extraction complete. Processed {count} papers."
     except Exception as e: return f"Error in extraction script: {e}"
-def duckduckgo_search(query: str, max_results: int = 3) -> str:
-    st.toast(f"🌐 Searching the web for: '{query}'")
+@st.cache_resource
+def _ddgs() -> DDGS:
+    # One client shared across reruns keeps its connection pool warm
+    return DDGS()
+def _ddg_text(query: str, max_results: int = 3) -> str:
     try:
-        results = DDGS().text(query, max_results=max_results)
+        results = _ddgs().text(query, max_results=max_results)
         return "\n".join(f"- {res['title']}: {res['body']}" for res in results)
     except Exception as e: return f"DuckDuckGo search error: {e}"
+def duckduckgo_search(query: str, max_results: int = 3) -> str:
+    st.toast(f"🌐 Searching the web for: '{query}'")
+    return _ddg_text(query, max_results)
+def duckduckgo_search_all(queries: list, max_results: int = 3) -> str:
+    """Runs the web searches concurrently; toasts are shown up front since worker threads can't reach the Streamlit context."""
+    for query in queries: st.toast(f"🌐 Searching the web for: '{query}'")
+    async def _gather():
+        loop = asyncio.get_running_loop()
+        return await asyncio.gather(*[loop.run_in_executor(None, _ddg_text, q, max_results) for q in queries])
+    return "".join(res + "\n\n" for res in asyncio.run(_gather()))
 
 # --- Vector Database (RAG) Management ---
+def embed_batch(texts: list) -> list:
+    """Embeds a batch of texts with a single /api/embed call, falling back to one call per text on older servers."""
+    try:
+        embeddings = ollama.embed(model=EMBEDDING_MODEL_NAME, input=texts)["embeddings"]
+        if len(embeddings) == len(texts): return embeddings
+        logger.warning(f"Batch embedding returned {len(embeddings)} vectors for {len(texts)} texts, falling back to per-text calls.")
+    except ValidationError:
+        # ollama.embed validates the reply, so a response without 'embeddings' surfaces here
+        logger.warning("Batch embedding response has no 'embeddings', falling back to per-text calls.")
+    except ollama.ResponseError as e:
+        # Only a missing endpoint means the server predates /api/embed; other errors are real failures
+        if e.status_code != 404: raise
+        logger.warning("/api/embed is not available, falling back to per-text calls.")
+    return [ollama.embeddings(model=EMBEDDING_MODEL_NAME, prompt=text)["embedding"] for text in texts]
+
+def embed_texts(texts: list, on_batch=None) -> np.ndarray:
+    """Embeds texts in concurrent /api/embed batches into an (N, D) FP32 matrix, showing a progress bar.
+
+    on_batch(start, batch_mat) is called from the script thread as each batch finishes, so results can be persisted
+    even if a later batch fails; the first failure is re-raised once all batches have been collected.
+    """
+    progress_bar = st.progress(0, text=f"Generating embeddings...")
+    total = len(texts); texts_iter = iter(texts)
+    batches = list(iter(lambda: list(islice(texts_iter, EMBED_BATCH_SIZE)), []))
+    emb_mat = None; done = 0; error = None
+    # Batches are sent concurrently so the server can interleave them; progress is reported from the script thread
+    with ThreadPoolExecutor(max_workers=min(EMBED_WORKERS, len(batches))) as executor:
+        futures = {executor.submit(embed_batch, batch): i for i, batch in enumerate(batches)}
+        for future in as_completed(futures):
+            try: batch_mat = np.asarray(future.result(), dtype=np.float32)
+            except Exception as e:
+                error = error or e; continue
+            start = futures[future] * EMBED_BATCH_SIZE
+            # The first finished batch tells us D; rows are written in place at their batch offset
+            if emb_mat is None: emb_mat = np.empty((total, batch_mat.shape[1]), dtype=np.float32)
+            emb_mat[start:start + len(batch_mat)] = batch_mat; done += len(batch_mat)
+            if on_batch: on_batch(start, batch_mat)
+            progress_bar.progress(done / total, text=f"Embedding chunk {done}/{total}")
+    progress_bar.empty()
+    if error: raise error
+    return emb_mat
+
+def _text_hash(text: str) -> bytes:
+    # The model name is part of the key so switching models never serves stale vectors
+    return hashlib.blake2b(f"{EMBEDDING_MODEL_NAME}\0{text}".encode(), digest_size=16).digest()
+
+def cached_embeddings(texts: list) -> np.ndarray:
+    """Returns an (N, D) FP32 embedding matrix for texts, only calling Ollama for texts missing from the on-disk cache."""
+    hashes = [_text_hash(t) for t in texts]; cached = {}
+    with closing(sqlite3.connect(EMBED_CACHE_PATH)) as conn:
+        conn.execute("CREATE TABLE IF NOT EXISTS embeddings (text_hash BLOB PRIMARY KEY, vector BLOB)")
+        for i in range(0, len(hashes), 500):  # stay below SQLite's bound-parameter limit
+            chunk = hashes[i:i + 500]
+            cached.update(conn.execute(f"SELECT text_hash, vector FROM embeddings WHERE text_hash IN ({','.join('?' * len(chunk))})", chunk))
+        missing = list({h: t for h, t in zip(hashes, texts) if h not in cached}.items())
+        def store_batch(start: int, batch_mat: np.ndarray):
+            # Each batch is committed as soon as it arrives so an interrupted run resumes from the cache
+            new_rows = [(h, row.tobytes()) for (h, _), row in zip(missing[start:start + len(batch_mat)], batch_mat)]
+            conn.executemany("INSERT OR REPLACE INTO embeddings VALUES (?, ?)", new_rows); conn.commit()
+            cached.update(new_rows)
+        if missing: embed_texts([t for _, t in missing], on_batch=store_batch)
+    if len(missing) < len(texts): st.toast(f"Reused {len(texts) - len(missing)} cached embedding(s).")
+    emb_mat = np.empty((len(texts), np.frombuffer(cached[hashes[0]], dtype=np.float32).size), dtype=np.float32)
+    for row, h in enumerate(hashes): emb_mat[row] = np.frombuffer(cached[h], dtype=np.float32)
+    return emb_mat
+
 def load_papers_into_db():
     json_files = list(PAPERS_DIR.glob("*.json"))
     if not json_files: return False
     MIN_CONTENT_LENGTH = 300; FORBIDDEN_TITLES = {'references', 'citations', 'quick links', 'arxivlabs', 'access paper'}; ERROR_SUBSTRINGS = ["fatal error", "abruptly"]
+    def is_valid_section(section: dict) -> bool:
+        # Cheapest checks first; the content is lowercased at most once per section
+        content = section.get("content", "")
+        if len(content) < MIN_CONTENT_LENGTH or section.get("title", "").lower() in FORBIDDEN_TITLES: return False
+        content_lower = content.lower()
+        return not any(e in content_lower for e in ERROR_SUBSTRINGS)
     valid_texts_to_embed = [] ; skipped_papers_count = 0
     for path in json_files:
-        with open(path, 'r', encoding='utf-8') as f: data = json.load(f)
-        paper_id = data.get('paper_id', 'Unknown'); link = data.get('link', '')
-        is_paper_valid = False; paper_sections = []
-        for section in data.get("sections", []):
-            title = section.get("title", "").lower(); content = section.get("content", "")
-            if any(e in content.lower() for e in ERROR_SUBSTRINGS) or title in FORBIDDEN_TITLES or len(content) < MIN_CONTENT_LENGTH: continue
-            paper_sections.append(f"Source: {paper_id} (Link: {link})\nSection: {section.get('title', 'Untitled')}\n\n{content}")
-            is_paper_valid = True
-        if is_paper_valid: valid_texts_to_embed.extend(paper_sections)
+        with open(path, 'rb') as f: data = orjson.loads(f.read())
+        source = f"Source: {data.get('paper_id', 'Unknown')} (Link: {data.get('link', '')})"
+        paper_sections = [f"{source}\nSection: {section.get('title', 'Untitled')}\n\n{section['content']}" for section in data.get("sections", []) if is_valid_section(section)]
+        if paper_sections: valid_texts_to_embed.extend(paper_sections)
         else: skipped_papers_count += 1
     if skipped_papers_count > 0: st.toast(f"Skipped {skipped_papers_count} poorly parsed paper(s).", icon="⚠️")
     if not valid_texts_to_embed: return False
-    embeddings = []; progress_bar = st.progress(0, text=f"Generating embeddings...")
-    for i, text in enumerate(valid_texts_to_embed):
-        response = ollama.embeddings(model=EMBEDDING_MODEL_NAME, prompt=text); embeddings.append(response["embedding"])
-        progress_bar.progress((i + 1) / len(valid_texts_to_embed), text=f"Embedding chunk {i + 1}/{len(valid_texts_to_embed)}")
-    progress_bar.empty()
-    data_to_add = [{"vector": emb, "text": txt} for emb, txt in zip(embeddings, valid_texts_to_embed)]
-    db = lancedb.connect(DB_URI); db.create_table("papers", data=data_to_add, mode="overwrite")
+    # Vectors are stored as FP16 to halve the bytes scanned per search; the index adds INT8 scalar quantization on top
+    emb_mat = cached_embeddings(valid_texts_to_embed).astype(np.float16); dim = emb_mat.shape[1]
+    schema = pa.schema([pa.field("vector", pa.list_(pa.float16(), dim)), pa.field("text", pa.string())])
+    data_to_add = pa.Table.from_arrays([pa.FixedSizeListArray.from_arrays(pa.array(emb_mat.reshape(-1)), dim), pa.array(valid_texts_to_embed)], schema=schema)
+    db = lancedb.connect(DB_URI); table = db.create_table("papers", data=data_to_add, mode="overwrite")
+    if table.count_rows() >= ANN_INDEX_MIN_ROWS:
+        table.create_index(metric="cosine", vector_column_name="vector", index_type="IVF_HNSW_SQ", num_partitions=max(1, table.count_rows() // 1000))
+    _get_table.clear(); _kb_generation()["value"] += 1
     st.toast("✅ Knowledge base updated!"); return True
 
 # --- Knowledge Base Search ---
-def search_knowledge_base(query: str, limit: int = 10) -> str:
-    """Performs a RAG search in the knowledge base."""
+@st.cache_resource
+def _kb_generation() -> dict:
+    """Process-wide counter bumped on every knowledge base rebuild; per-session result caches are tied to it."""
+    return {"value": 0}
+
+@st.cache_resource
+def _get_table():
+    """Returns the cached 'papers' table handle; raises LookupError (which is not cached) if the knowledge base is empty."""
     db = lancedb.connect(DB_URI)
-    if "papers" not in db.table_names():
-        return ""
-    table = db.open_table("papers")
+    if "papers" not in db.table_names(): raise LookupError("The knowledge base has no 'papers' table yet.")
+    return db.open_table("papers")
+
+def search_knowledge_base(query: str, limit: int = 10) -> str:
+    """Performs a RAG search in the knowledge base, reusing results of identical or semantically close queries."""
+    exact_cache = _session_cache("kb_exact_cache"); semantic_cache = _session_cache("kb_semantic_cache")
+    generation = _kb_generation()["value"]
+    if st.session_state.get("kb_cache_generation") != generation:
+        # The knowledge base was rebuilt (possibly by another session), so earlier results are stale
+        exact_cache.clear(); semantic_cache.clear(); st.session_state.kb_cache_generation = generation
+    key = (" ".join(query.lower().split()), limit)
+    if key in exact_cache:
+        exact_cache.move_to_end(key); return exact_cache[key]
+    try: table = _get_table()
+    except LookupError: return ""
     
     query_embedding = ollama.embeddings(model=EMBEDDING_MODEL_NAME, prompt=query)["embedding"]
-    results = table.search(query_embedding).limit(limit).to_list()
+    q = np.asarray(query_embedding, dtype=np.float32); q /= np.linalg.norm(q) or 1.0
+    candidates = [(k, vec) for k, (vec, _) in semantic_cache.items() if k[1] == limit]
+    if candidates:
+        similarities = np.stack([vec for _, vec in candidates]) @ q; best = int(np.argmax(similarities))
+        if similarities[best] >= SEMANTIC_CACHE_THRESHOLD:
+            hit_key = candidates[best][0]; semantic_cache.move_to_end(hit_key)
+            result = semantic_cache[hit_key][1]; _cache_put(exact_cache, key, result); return result
+    results = table.search(np.asarray(query_embedding, dtype=np.float16)).distance_type("cosine").nprobes(ANN_NPROBES).ef(ANN_EF).limit(limit).to_list()
 
-    
-    return "\n\n---\n\n".join([res['text'] for res in results])
+    result = "\n\n---\n\n".join([res['text'] for res in results])
+    _cache_put(exact_cache, key, result); _cache_put(semantic_cache, key, (q, result))
+    return result
+
+
+# --- PROMPTS ---
+# System prompts are fixed module-level strings holding all static instructions, and the volatile data goes at the
+# end of the user message, so repeated calls share a byte-identical prefix that Ollama can serve from its KV cache.
+RESEARCH_QUERIES_SYSTEM_PROMPT = """You are an expert at creating concise, diverse search queries for academic databases.
+Based on the user's research request, generate 2-3 diverse and effective search queries (maximum 6 words) for the Arxiv database. Respond in JSON format with a single key "queries" which is a list of strings."""
+
+KEYWORD_SYSTEM_PROMPT = """You are a keyword extraction specialist.
+From the user's question, extract the core keywords to search in a vector database."""
+
+WEB_QUERIES_SYSTEM_PROMPT = """You are a Research Planner that generates effective web search queries.
+Based on the user's question and the information already found in our local papers, what specific, targeted questions should we ask a web search engine to fill in the gaps? Generate up to 3 concise search queries. Respond in JSON with a single key "queries"."""
+
+ANALYST_SYSTEM_PROMPT = """
+You are a brilliant, insightful academic research analyst. Your job is to combine evidence, reason logically, and write in clear, structured Markdown.
+
+**Additional Rules:**
+- Write in academic yet natural tone (not robotic).
+- Add short subtitles for each theme.
+- If data is contradictory, mention it explicitly.
+- When no citations available, infer cautiously and note uncertainty.
+- Use bullet points when comparing ideas.
+"""
+
+CHAT_QUERIES_SYSTEM_PROMPT = """You are an expert at generating helpful, relevant search queries.
+The user is asking a general question or starting a conversation. Analyze their input and generate 2-3 web search queries to find helpful information for a thoughtful response.
+Respond in JSON format with a single key "queries"."""
+
+CHAT_SYSTEM_PROMPT = """
+You are a News Aggregator and Factual Assistant.
+Your SOLE PURPOSE is to answer the user's question by summarizing the information found in the `Web Search Results`.
+- **DO NOT refuse to answer.**
+- **DO NOT apologize or say you cannot provide real-time information.**
+- **DO NOT recommend other websites.**
+- Directly synthesize the information from the `Web Search Results` into a helpful, coherent answer.
+- If the user is just saying "Hello," respond naturally as a friendly assistant.
+"""
 
 
 # --- AGENT FLOWS ---
@@ -102,23 +279,28 @@ def run_llm_agent(system_prompt: str, user_prompt: str, use_json=False):
     response = ollama.chat(model=LLM_MODEL_NAME, messages=messages, format=format_type)
     return response['message']['content']
 
+def generate_queries(system_prompt: str, user_prompt: str) -> list:
+    """Asks the LLM for a JSON list of search queries; raises json.JSONDecodeError on malformed output."""
+    # Only a parsed, non-empty list is memoized, so bad model output is sampled again on the next try
+    cache = _session_cache("query_cache"); key = (system_prompt, user_prompt, True)
+    if key in cache:
+        cache.move_to_end(key); return cache[key]
+    parsed = json.loads(run_llm_agent(system_prompt, user_prompt, use_json=True))
+    queries = parsed.get("queries", []) if isinstance(parsed, dict) else []
+    if queries: _cache_put(cache, key, queries)
+    return queries
+
 def run_research_flow(user_input: str):
-    queries_prompt = f"""Based on the user's research request, generate 2-3 diverse and effective search queries (maximum 6 words) for the Arxiv database. Respond in JSON format with a single key "queries" which is a list of strings. User Request: "{user_input}" """
-    try:
-        response_str = run_llm_agent("You are an expert at creating concise, diverse search queries for academic databases.", queries_prompt, use_json=True)
-        search_queries = json.loads(response_str)["queries"]
-    except (json.JSONDecodeError, KeyError): search_queries = [user_input]
+    try: search_queries = generate_queries(RESEARCH_QUERIES_SYSTEM_PROMPT, f'User Request: "{user_input}"') or [user_input]
+    except json.JSONDecodeError: search_queries = [user_input]
     st.info(f"**Agent's Plan:** Starting research with the following queries:\n" + "\n".join(f"- `{q}`" for q in search_queries))
     all_papers = []; seen_links = set()
-    for query in search_queries:
-        run_search_script(query)
-        if os.path.exists(SEARCH_RESULT_FILE):
-            with open(SEARCH_RESULT_FILE, 'r', encoding='utf-8') as f: papers = json.load(f)
-            for paper in papers:
-                link = paper.get("tam_metin_linki")
-                if link and link not in seen_links: all_papers.append(paper); seen_links.add(link)
+    for papers in search_all(search_queries):
+        for paper in papers:
+            link = paper.get("tam_metin_linki")
+            if link and link not in seen_links: all_papers.append(paper); seen_links.add(link)
     if all_papers:
-        with open(SEARCH_RESULT_FILE, 'w', encoding='utf-8') as f: json.dump(all_papers, f, ensure_ascii=False, indent=4)
+        with open(SEARCH_RESULT_FILE, 'wb') as f: f.write(orjson.dumps(all_papers, option=orjson.OPT_INDENT_2))
         st.toast(f"Found and combined a total of {len(all_papers)} unique papers.")
     run_extract_script(); success = load_papers_into_db()
     final_msg = f"Research completed using {len(search_queries)} queries, finding a total of {len(all_papers)} unique papers."
@@ -130,8 +312,7 @@ def run_research_flow(user_input: str):
 
 def librarian_agent(user_input: str) -> str:
     st.info("`Librarian Agent:` Searching the local knowledge base...")
-    keyword_prompt = f"""From the user's question, extract the core keywords to search in a vector database. Question: "{user_input}" """
-    keyword_query = run_llm_agent("You are a keyword extraction specialist.", keyword_prompt)
+    keyword_query = run_llm_agent(KEYWORD_SYSTEM_PROMPT, f'Question: "{user_input}"')
     context = search_knowledge_base(keyword_query, limit=10)
     if not context:
         st.warning("`Librarian Agent:` Found no relevant information in the local papers.")
@@ -139,15 +320,13 @@ def librarian_agent(user_input: str) -> str:
 
 def web_researcher_agent(user_input: str, local_context: str) -> str:
     st.info("`Web Researcher Agent:` Planning and executing web search...")
-    web_queries_prompt = f"""Based on the user's question and the information already found in our local papers, what specific, targeted questions should we ask a web search engine to fill in the gaps? Generate up to 3 concise search queries. Respond in JSON with a single key "queries". User Question: "{user_input}" Found Local Context: "{local_context[:1000]}" """
+    web_queries_prompt = f"""User Question: "{user_input}" Found Local Context: "{local_context[:1000]}" """
     web_context = ""
     try:
-        response_str = run_llm_agent("You are a Research Planner that generates effective web search queries.", web_queries_prompt, use_json=True)
-        web_queries = json.loads(response_str).get("queries", [])
+        web_queries = generate_queries(WEB_QUERIES_SYSTEM_PROMPT, web_queries_prompt)
         if web_queries:
             st.info(f"**Internal Step:** Searching the web with generated queries:\n" + "\n".join(f"- `{q}`" for q in web_queries))
-            for query in web_queries:
-                web_context += duckduckgo_search(query) + "\n\n"
+            web_context = duckduckgo_search_all(web_queries)
         else:
             st.warning("`Web Researcher Agent:` Could not generate specific queries, falling back to a direct search.")
             web_context = duckduckgo_search(user_input)
@@ -159,26 +338,18 @@ def web_researcher_agent(user_input: str, local_context: str) -> str:
 
 def lead_analyst_agent(user_input: str, local_context: str, web_context: str) -> str:
     st.info("`Lead Analyst Agent:` Synthesizing all information and generating new insights...")
-    system_prompt = """
-You are a brilliant, insightful academic research analyst. Your job is to combine evidence, reason logically, and write in clear, structured Markdown.
-
-**Additional Rules:**
-- Write in academic yet natural tone (not robotic).
-- Add short subtitles for each theme.
-- If data is contradictory, mention it explicitly.
-- When no citations available, infer cautiously and note uncertainty.
-- Use bullet points when comparing ideas.
-"""
-    final_user_prompt = f"""**User's Question/Idea:** "{user_input}"
----
-**Librarian's Findings (from papers):**
+    final_user_prompt = f"""**Librarian's Findings (from papers):**
 {local_context or 'The Librarian found no relevant information in the local knowledge base.'}
 ---
 **Web Researcher's Report:**
-{web_context or 'The Web Researcher found no relevant information.'}"""
-    return run_llm_agent(system_prompt, final_user_prompt)
+{web_context or 'The Web Researcher found no relevant information.'}
+---
+**User's Question/Idea:** "{user_input}"
+"""
+    return run_llm_agent(ANALYST_SYSTEM_PROMPT, final_user_prompt)
 
 def run_analysis_flow(user_input: str):
+    # The stages stay sequential: the web planner's prompt includes the librarian's findings, and the analyst needs both
     local_findings = librarian_agent(user_input)
     web_report = web_researcher_agent(user_input, local_findings)
     final_analysis = lead_analyst_agent(user_input, local_findings, web_report)
@@ -186,42 +357,27 @@ def run_analysis_flow(user_input: str):
 
 def run_chat_flow(user_input: str):
 
-    # Step 1: Generating smart queries 
-    queries_prompt = f"""
-    The user is asking a general question or starting a conversation. Analyze their input and generate 2-3 web search queries to find helpful information for a thoughtful response.
-    Respond in JSON format with a single key "queries". User Input: "{user_input}"
-    """
+    # Step 1: Generating smart queries
     web_context = ""
     try:
-        response_str = run_llm_agent("You are an expert at generating helpful, relevant search queries.", queries_prompt, use_json=True)
-        web_queries = json.loads(response_str).get("queries", [])
+        web_queries = generate_queries(CHAT_QUERIES_SYSTEM_PROMPT, f'User Input: "{user_input}"')
         if web_queries:
             # Gives a message in Streamlit UI about the internal step
             st.info(f"**Internal Step:** Thinking and searching the web with generated queries:\n" + "\n".join(f"- `{q}`" for q in web_queries))
-            for query in web_queries:
-                web_context += duckduckgo_search(query) + "\n\n"
+            web_context = duckduckgo_search_all(web_queries)
         else:
             web_context = duckduckgo_search(user_input)
     except (json.JSONDecodeError, KeyError):
         web_context = duckduckgo_search(user_input)
 
     # Step 2: Generating response with context
-    system_prompt = """
-    You are a News Aggregator and Factual Assistant.
-    Your SOLE PURPOSE is to answer the user's question by summarizing the information found in the `Web Search Results`.
-    - **DO NOT refuse to answer.**
-    - **DO NOT apologize or say you cannot provide real-time information.**
-    - **DO NOT recommend other websites.**
-    - Directly synthesize the information from the `Web Search Results` into a helpful, coherent answer.
-    - If the user is just saying "Hello," respond naturally as a friendly assistant.
-    """
     final_user_prompt = f"""
-    User's Input: "{user_input}"
-    ---
     Web Search Results:
     {web_context or "No information was found on the web."}
+    ---
+    User's Input: "{user_input}"
     """
-    return run_llm_agent(system_prompt, final_user_prompt)
+    return run_llm_agent(CHAT_SYSTEM_PROMPT, final_user_prompt)
 
 
 # --- STREAMLIT UI ---
@@ -236,6 +392,7 @@ with st.sidebar:
     st.write(f"**Knowledge Base:** {kb_status}")
     if st.button("Reset System (Deletes Data)"):
         st.session_state.clear()
+        _get_table.clear(); _kb_generation()["value"] += 1  # release the open Lance handle before its files are deleted
         if DATA_DIR.exists(): shutil.rmtree(DATA_DIR)
         setup_directories()
         st.rerun()
@@ -1,13 +1,25 @@
 import argparse
-import json
+import hashlib
 import os
 import re
+import tempfile
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from dataclasses import dataclass
-from typing import List, Optional
+from typing import Callable, List, Optional, Tuple
 from urllib.parse import urlparse
 
+import orjson
 import requests
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, Tag
+from requests.adapters import HTTPAdapter
+
+MAX_WORKERS = 8
+
+_WS = re.compile(r"\s+")
+_NONALNUM = re.compile(r"[^a-zA-Z0-9._-]")
+_UNDERS = re.compile(r"_+")
+_ARXIV_PATH = re.compile(r"(?:abs|pdf)/(.+?)(?:\.pdf)?$")
 
 
 # ----------------------------- Yardımcı Modeller -----------------------------
@@ -19,65 +31,80 @@ class Section:
 
 # ---------------------------- Yardımcı Fonksiyonlar ---------------------------
 def secure_filename(name: str) -> str:
-    name = re.sub(r"[^a-zA-Z0-9._-]", "_", name)
-    return re.sub(r"_+", "_", name).strip("._")
+    name = _NONALNUM.sub("_", name)
+    return _UNDERS.sub("_", name).strip("._")
 
 
-def arxiv_to_ar5iv_html(url: str) -> Optional[str]:
-    parsed = urlparse(url)
-    if "arxiv.org" not in parsed.netloc:
-        return None
+def _parse_arxiv(link: str) -> Tuple[str, Optional[str]]:
+    """Linki tek geçişte çözümler: (paper_id, ar5iv_url). arXiv dışı linkler için ar5iv_url None olur."""
+    parsed = urlparse(link)
     path = parsed.path.strip("/")
-    arxiv_id: Optional[str] = None
-    if path.startswith("abs/"):
-        arxiv_id = path[len("abs/"):]
-    elif path.startswith("pdf/"):
-        arxiv_id = path[len("pdf/"):]
-        if arxiv_id.endswith(".pdf"):
-            arxiv_id = arxiv_id[:-4]
-    else:
-        # Beklenmeyen formatlar için tüm path'i id olarak kullanmayı dene
-        arxiv_id = path
-    if not arxiv_id:
-        return None
-    return f"https://ar5iv.org/html/{arxiv_id}"
+    m = _ARXIV_PATH.match(path)
+    # Beklenmeyen formatlar için tüm path'i id olarak kullanmayı dene
+    arxiv_id = m.group(1) if m else path
+    ar5iv_url = f"https://ar5iv.org/html/{arxiv_id}" if arxiv_id and "arxiv.org" in parsed.netloc else None
+    return secure_filename(arxiv_id), ar5iv_url
+
+
+def make_session() -> requests.Session:
+    # Eşzamanlı indirmeler için bağlantı havuzunu iş parçacığı sayısı kadar büyüt
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=MAX_WORKERS, pool_maxsize=MAX_WORKERS)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def _atomic_write(path: str, text: str) -> None:
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
 
 
-def fetch_html(url: str) -> str:
+def fetch_html(url: str, session: Optional[requests.Session] = None, cache_dir: Optional[str] = None) -> str:
     headers = {
         "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64)"
     }
-    resp = requests.get(url, headers=headers, timeout=60)
+    # Önbellekte ETag'i olan sayfalar koşullu istenir; 304 gelirse gövde yeniden indirilmez
+    if cache_dir:
+        html_path = os.path.join(cache_dir, hashlib.sha1(url.encode()).hexdigest() + ".html")
+        etag_path = html_path + ".etag"
+        if os.path.exists(html_path) and os.path.exists(etag_path):
+            with open(etag_path, "r", encoding="utf-8") as f:
+                headers["If-None-Match"] = f.read().strip()
+    resp = (session or requests).get(url, headers=headers, timeout=60)
+    if cache_dir and resp.status_code == 304:
+        with open(html_path, "r", encoding="utf-8") as f:
+            return f.read()
     resp.raise_for_status()
+    # ETag'siz sayfalar koşullu istenemez; önbelleğe yazmak boşa olur
+    if cache_dir and resp.headers.get("ETag"):
+        os.makedirs(cache_dir, exist_ok=True)
+        # Önce eski ETag silinir, ETag en son yazılır: yarıda kalan bir yazım asla 304 ile sunulmaz
+        if os.path.exists(etag_path):
+            os.remove(etag_path)
+        _atomic_write(html_path, resp.text)
+        _atomic_write(etag_path, resp.headers["ETag"])
     return resp.text
 
 
 def clean_text(s: str) -> str:
-    s = re.sub(r"\s+", " ", s)
-    return s.strip()
+    return _WS.sub(" ", s).strip()
 
 
 def remove_headers_and_footers(lines: List[str]) -> List[str]:
     # Sayfa başlık/altlıkları çok tekrar eder: frekans > 3 ise at
-    from collections import Counter
-    norm = lambda s: re.sub(r"\s+", " ", s.strip())
-    counts = Counter(norm(l) for l in lines if l.strip())
+    # Her satır bir kez normalize edilir; sayım ve filtreleme aynı listeyi kullanır
+    normed = [_WS.sub(" ", l).strip() for l in lines]
+    counts = Counter(n for n in normed if n)
     to_drop = {t for t, c in counts.items() if c >= 3 and len(t) <= 80}
-    cleaned = []
-    for l in lines:
-        t = norm(l)
-        if not t:
-            cleaned.append("")
-            continue
-        if t in to_drop:
-            cleaned.append("")
-            continue
-        # Tek başına sayfa numarası gibi satırları at
-        if re.fullmatch(r"\d+", t):
-            cleaned.append("")
-            continue
-        cleaned.append(l)
-    return cleaned
+    # Boş satırlar ve tek başına sayfa numarası gibi satırlar da atılır
+    return ["" if not t or t in to_drop or t.isdigit() else l for l, t in zip(lines, normed)]
 
 
 STOP_TITLES = {
@@ -85,9 +112,25 @@ STOP_TITLES = {
     "supplementary material", "bibliography"
 }
 
+HEADING_TAGS = {"h1", "h2", "h3", "h4"}
+BLOCK_TAGS = {"p", "ul", "ol"}
+# Kod blokları, tablolar ve şekiller gürültülü metin üretir; içlerine hiç inilmez
+SKIP_TAGS = {"pre", "table", "figure"}
+
+
+def iter_top_level_blocks(root: Tag):
+    """Başlık ve metin bloklarını belge sırasıyla verir; yakalanan bir bloğun alt elemanlarına inmez."""
+    stack = [c for c in reversed(root.contents) if isinstance(c, Tag)]
+    while stack:
+        el = stack.pop()
+        if el.name in HEADING_TAGS or el.name in BLOCK_TAGS:
+            yield el
+        elif el.name not in SKIP_TAGS:
+            stack.extend(c for c in reversed(el.contents) if isinstance(c, Tag))
+
 
 def parse_sections_from_ar5iv_html(html: str) -> List[Section]:
-    soup = BeautifulSoup(html, "html.parser")
+    soup = BeautifulSoup(html, "lxml")
 
     # Önce özeti yakala
     sections: List[Section] = []
@@ -106,13 +149,13 @@ def parse_sections_from_ar5iv_html(html: str) -> List[Section]:
 
     def flush():
         if current_title and current_chunks:
-            content = clean_text("\n".join(current_chunks))
+            content = clean_text(" ".join(current_chunks))
             if content:
                 sections.append(Section(title=current_title, content=content))
 
     # ar5iv genellikle <h2> ana bölümler, <h3> alt bölümler
-    for el in article.find_all(["h1", "h2", "h3", "h4", "p", "ul", "ol", "pre", "table", "figure"], recursive=True):
-        if el.name in {"h1", "h2", "h3", "h4"}:
+    for el in iter_top_level_blocks(article):
+        if el.name in HEADING_TAGS:
             title = clean_text(el.get_text(" "))
             # referans/ek sonrası kes
             if title.lower() in STOP_TITLES:
@@ -125,10 +168,9 @@ def parse_sections_from_ar5iv_html(html: str) -> List[Section]:
                 flush()
                 current_chunks = []
             current_title = title
-        else:
-            text = clean_text(el.get_text(" "))
-            if text and current_title:
-                current_chunks.append(text)
+        elif current_title:
+            # Ham metin biriktirilir; boşluk temizliği flush() içinde bölüm başına bir kez yapılır
+            current_chunks.append(el.get_text(" "))
     # son bölüm
     flush()
 
@@ -140,42 +182,29 @@ def parse_sections_from_ar5iv_html(html: str) -> List[Section]:
     return sections
 
 
-def extract_sections_from_arxiv_link(link: str) -> List[Section]:
-    ar5iv_url = arxiv_to_ar5iv_html(link)
-    if not ar5iv_url:
-        raise ValueError(f"arXiv linki algılanamadı: {link}")
-    html = fetch_html(ar5iv_url)
-    sections = parse_sections_from_ar5iv_html(html)
-    return sections
-
-
 # --------------------------------- Ana Akış ---------------------------------
-def process_paper(arxiv_link: str, output_dir: str = "papers") -> Optional[List[dict]]:
+def process_paper(arxiv_link: str, output_dir: str = "papers", session: Optional[requests.Session] = None,
+                  cache_dir: Optional[str] = None) -> Optional[List[dict]]:
     os.makedirs(output_dir, exist_ok=True)
 
-    # paper_id'yi arxiv linkinden üret
-    parsed = urlparse(arxiv_link)
-    pid = parsed.path.strip("/")
-    if pid.startswith("abs/"):
-        pid = pid[len("abs/"):]
-    elif pid.startswith("pdf/"):
-        pid = pid[len("pdf/"):]
-        if pid.endswith(".pdf"):
-            pid = pid[:-4]
-    paper_id = secure_filename(pid)
+    # paper_id ve ar5iv adresini arxiv linkinden tek seferde üret
+    paper_id, ar5iv_url = _parse_arxiv(arxiv_link)
 
     try:
-        sections = extract_sections_from_arxiv_link(arxiv_link)
+        if not ar5iv_url:
+            raise ValueError(f"arXiv linki algılanamadı: {arxiv_link}")
+        html = fetch_html(ar5iv_url, session=session, cache_dir=cache_dir)
+        sections = parse_sections_from_ar5iv_html(html)
         sections_json = [{"title": s.title, "content": s.content} for s in sections]
 
         out_path = os.path.join(output_dir, f"{paper_id}.json")
-        with open(out_path, "w", encoding="utf-8") as f:
-            json.dump({
+        with open(out_path, "wb") as f:
+            f.write(orjson.dumps({
                 "paper_id": paper_id,
                 "link": arxiv_link,
-                "ar5iv_url": arxiv_to_ar5iv_html(arxiv_link),
+                "ar5iv_url": ar5iv_url,
                 "sections": sections_json
-            }, f, ensure_ascii=False, indent=2)
+            }, option=orjson.OPT_INDENT_2))
 
         print(f"Makale işlendi: {paper_id} -> {out_path}")
         return sections_json
@@ -184,20 +213,26 @@ def process_paper(arxiv_link: str, output_dir: str = "papers") -> Optional[List[
         return None
 
 
-def process_multiple_papers(json_file: str, output_dir: str = "papers", limit: Optional[int] = None) -> None:
-    with open(json_file, "r", encoding="utf-8") as f:
-        data = json.load(f)
-    sayac = 0
-    for paper in data:
-        link = paper.get("tam_metin_linki")
-        if not link:
-            continue
-        if "arxiv.org" not in link:
-            continue
-        process_paper(link, output_dir=output_dir)
-        sayac += 1
-        if limit is not None and sayac >= limit:
-            break
+def process_multiple_papers(json_file: str, output_dir: str = "papers", limit: Optional[int] = None,
+                            on_progress: Optional[Callable[[int, int], None]] = None,
+                            cache_dir: Optional[str] = None) -> None:
+    """on_progress(tamamlanan, toplam) çağıran iş parçacığında, her makale bittiğinde çağrılır."""
+    with open(json_file, "rb") as f:
+        data = orjson.loads(f.read())
+    links = [paper.get("tam_metin_linki") for paper in data]
+    links = [link for link in links if link and "arxiv.org" in link]
+    if limit is not None:
+        links = links[:limit]
+    if not links:
+        return
+
+    # Makaleleri paylaşılan bir oturumla eşzamanlı indir
+    os.makedirs(output_dir, exist_ok=True)
+    with make_session() as session, ThreadPoolExecutor(max_workers=MAX_WORKERS) as ex:
+        futures = [ex.submit(process_paper, link, output_dir, session, cache_dir) for link in links]
+        for done, _ in enumerate(as_completed(futures), start=1):
+            if on_progress:
+                on_progress(done, len(links))
 
 
 def main():
@@ -205,9 +240,10 @@ def main():
     parser.add_argument("--json-file", default="arastirma_sonuclari.json", help="Kaynak JSON dosyası")
     parser.add_argument("--output-dir", default="papers", help="Çıktı klasörü")
     parser.add_argument("--limit", type=int, default=None, help="İşlenecek makale sayısını sınırla")
+    parser.add_argument("--cache-dir", default=None, help="İndirilen HTML sayfaları için önbellek klasörü")
     args = parser.parse_args()
 
-    process_multiple_papers(args.json_file, output_dir=args.output_dir, limit=args.limit)
+    process_multiple_papers(args.json_file, output_dir=args.output_dir, limit=args.limit, cache_dir=args.cache_dir)
 
 
 if __name__ == "__main__":